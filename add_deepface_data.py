@@ -1,11 +1,29 @@
 """
 Add DeepFace analysis data to mugshots.json entries.
 Processes each entry that has a local picture file and adds deepface analysis results.
-Resumable - saves progress incrementally and skips already processed entries.
+Resumable - appends each result to output/deepface_results.jsonl and skips entries
+already analyzed there or in mugshots.json. mugshots.json itself is only rewritten
+every COMPACT_EVERY results and once at the end.
+
+Inference runs through ONNX Runtime when the models have been exported to
+output/onnx/ (python add_deepface_data.py --export-onnx) and onnxruntime is
+installed; TensorRT (FP16) and CUDA providers are preferred when available.
+Otherwise the Keras models are used directly.
+
+With DEEPFACE_CPU_ONLY=1 (or --workers N) the pending entries are split across
+worker processes, each pinned to its own CPUs and writing its own
+output/deepface_shard_<k>.jsonl, which is merged into the main log at the end.
 """
+import argparse
+import atexit
+import io
+import multiprocessing
 import os
-import json
+import threading
+import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 from datetime import datetime
 
@@ -16,7 +34,51 @@ os.environ["TF_CPP_MIN_VLOG_LEVEL"] = "3"
 if os.environ.get("DEEPFACE_CPU_ONLY", "").lower() in ("1", "true", "yes"):
     os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
-from deepface import DeepFace
+# Bound TensorFlow's CPU thread pools (must be set before TF loads); existing values win
+os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(max(1, (os.cpu_count() or 2) // 2)))
+os.environ.setdefault("TF_NUM_INTEROP_THREADS", "2")
+os.environ.setdefault("OMP_NUM_THREADS", os.environ["TF_NUM_INTRAOP_THREADS"])
+
+import cv2
+import numpy as np
+import orjson
+
+# TensorFlow/DeepFace are imported lazily so worker processes can size their
+# thread pools (see _pin_worker) before TF initializes.
+
+# Number of images per forward pass through the attribute models
+BATCH_SIZE = 128
+# Threads decoding/detecting/resizing images ahead of each forward pass
+PREPROCESS_WORKERS = 8
+# Mugshots are already face-centered crops, so face detection is skipped. Any other
+# backend is run under _detect_lock: DeepFace caches one detector per backend and
+# shares it across the PREPROCESS_WORKERS threads.
+DETECTOR_BACKEND = "skip"
+# Flush the JSONL results log every FLUSH_EVERY records
+FLUSH_EVERY = 50
+# Rewrite mugshots.json from the results log every COMPACT_EVERY new results
+COMPACT_EVERY = 500
+# Flush the buffered processing log at least this often (seconds)
+LOG_FLUSH_SECONDS = 5
+ATTRIBUTE_MODELS = ["Age", "Gender", "Race", "Emotion"]
+ONNX_DIR = Path(__file__).parent / "output" / "onnx"
+ONNX_PROVIDERS = [
+    ("TensorrtExecutionProvider", {"trt_fp16_enable": True}),
+    "CUDAExecutionProvider",
+    "CPUExecutionProvider",
+]
+
+# Class labels in model output order (same as deepface.models.demography)
+GENDER_LABELS = ["Woman", "Man"]
+RACE_LABELS = ["asian", "indian", "black", "white", "middle eastern", "latino hispanic"]
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+# Forward pass over the four attribute models (ONNX Runtime or Keras), built once by build_models()
+_predict = None
+# Serializes log writes with the background flusher started by open_log()
+_log_lock = threading.Lock()
+# Serializes face detection across preprocessing threads (unused with DETECTOR_BACKEND="skip")
+_detect_lock = threading.Lock()
 
 
 def _f(x, decimals: int = 1):
@@ -27,62 +89,381 @@ def _f(x, decimals: int = 1):
         return x
 
 
-def analyze_image(image_path: str):
-    """Run DeepFace analysis on an image and return formatted results."""
+def _build_keras_models():
+    from deepface import DeepFace
+
+    return [DeepFace.build_model(model_name=name, task="facial_attribute").model for name in ATTRIBUTE_MODELS]
+
+
+def export_onnx(onnx_dir=ONNX_DIR):
+    """One-time export of the Age/Gender/Race/Emotion Keras models to ONNX."""
+    import tf2onnx
+
+    onnx_dir.mkdir(parents=True, exist_ok=True)
+    for name, model in zip(ATTRIBUTE_MODELS, _build_keras_models()):
+        output_path = onnx_dir / f"{name.lower()}.onnx"
+        tf2onnx.convert.from_keras(model, opset=15, output_path=str(output_path))
+        print(f"Exported {name} model to {output_path}")
+
+
+def _build_onnx_predict(onnx_dir):
+    """Return a predict function backed by ONNX Runtime sessions, or None if unavailable."""
+    paths = [onnx_dir / f"{name.lower()}.onnx" for name in ATTRIBUTE_MODELS]
+    if not all(p.exists() for p in paths):
+        return None
     try:
-        result = DeepFace.analyze(
-            img_path=image_path,
-            actions=["age", "gender", "race", "emotion"]
+        import onnxruntime as ort
+    except ImportError:
+        return None
+
+    available = set(ort.get_available_providers())
+    providers = [p for p in ONNX_PROVIDERS if (p[0] if isinstance(p, tuple) else p) in available]
+    age_sess, gender_sess, race_sess, emotion_sess = (
+        ort.InferenceSession(str(p), providers=providers) for p in paths
+    )
+    print(f"Using ONNX Runtime ({', '.join(age_sess.get_providers())})")
+
+    def run(sess, x):
+        return sess.run(None, {sess.get_inputs()[0].name: x})[0]
+
+    def predict(faces, gray_faces):
+        return (
+            run(age_sess, faces),
+            run(gender_sess, faces),
+            run(race_sess, faces),
+            run(emotion_sess, gray_faces),
         )
-        
-        # Handle both single dict and list of dicts
-        face = result[0] if isinstance(result, list) else result
-        
-        # Extract data in the format shown in terminal output
-        deepface_data = {
-            "age": int(face.get("age", 0)),
+
+    return predict
+
+
+def _build_keras_predict():
+    """Return a predict function running the Keras models fused in one tf.function."""
+    import tensorflow as tf
+
+    age_model, gender_model, race_model, emotion_model = _build_keras_models()
+
+    @tf.function(reduce_retracing=True)
+    def fused(faces, gray_faces):
+        return (
+            age_model(faces, training=False),
+            gender_model(faces, training=False),
+            race_model(faces, training=False),
+            emotion_model(gray_faces, training=False),
+        )
+
+    def predict(faces, gray_faces):
+        outputs = fused(tf.convert_to_tensor(faces), tf.convert_to_tensor(gray_faces))
+        return tuple(o.numpy() for o in outputs)
+
+    return predict
+
+
+def build_models():
+    """Build the attribute models once. Returns predict(faces, gray_faces) -> (age, gender, race, emotion) probabilities."""
+    global _predict
+    if _predict is None:
+        _predict = _build_onnx_predict(ONNX_DIR) or _build_keras_predict()
+    return _predict
+
+
+def preprocess_image(image_path: str):
+    """Load the face once and return (224x224 BGR face, 48x48 grayscale face, face_confidence)."""
+    from deepface.modules import detection, preprocessing
+
+    with nullcontext() if DETECTOR_BACKEND == "skip" else _detect_lock:
+        face_obj = detection.extract_faces(
+            img_path=image_path,
+            detector_backend=DETECTOR_BACKEND,
+            enforce_detection=False,
+            align=False
+        )[0]
+    # extract_faces returns RGB; the attribute models expect BGR like DeepFace.analyze feeds them
+    face = preprocessing.resize_image(img=face_obj["face"][:, :, ::-1], target_size=(224, 224))[0]
+    face = face.astype(np.float32)
+    gray = cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), (48, 48))[:, :, np.newaxis]
+    return face, gray, face_obj.get("confidence", 0)
+
+
+def _try_preprocess(image_path: str):
+    """preprocess_image() that reports the error and returns None on failure."""
+    try:
+        return preprocess_image(image_path)
+    except Exception as e:
+        print(f"Error analyzing {image_path}: {e}", file=sys.stderr)
+        return None
+
+
+def _format_batch(age_probs, gender_probs, race_probs, emotion_probs, face_confidences):
+    """Convert (N, classes) softmax outputs into N entries in the DEEPFACE format."""
+    rows = np.arange(len(age_probs))
+    ages = (age_probs * np.arange(age_probs.shape[1])).sum(axis=1)
+    gender = 100 * gender_probs
+    race = 100 * race_probs / race_probs.sum(axis=1, keepdims=True)
+    emotion = 100 * emotion_probs / emotion_probs.sum(axis=1, keepdims=True)
+    gender_idx = gender.argmax(axis=1)
+    race_idx = race.argmax(axis=1)
+    emotion_idx = emotion.argmax(axis=1)
+    gender_conf = gender[rows, gender_idx]
+    race_conf = race[rows, race_idx]
+    emotion_conf = emotion[rows, emotion_idx]
+    return [
+        {
+            "age": int(ages[j]),
             "gender": {
-                "dominant": face.get("dominant_gender", ""),
-                "confidence": _f(face.get("gender", {}).get(face.get("dominant_gender", ""), 0), 1)
+                "dominant": GENDER_LABELS[gender_idx[j]],
+                "confidence": _f(gender_conf[j], 1)
             },
             "race": {
-                "dominant": face.get("dominant_race", ""),
-                "confidence": _f(face.get("race", {}).get(face.get("dominant_race", ""), 0), 1)
+                "dominant": RACE_LABELS[race_idx[j]],
+                "confidence": _f(race_conf[j], 1)
             },
             "emotion": {
-                "dominant": face.get("dominant_emotion", ""),
-                "confidence": _f(face.get("emotion", {}).get(face.get("dominant_emotion", ""), 0), 1)
+                "dominant": EMOTION_LABELS[emotion_idx[j]],
+                "confidence": _f(emotion_conf[j], 1)
             },
-            "face_confidence": _f(face.get("face_confidence", 0), 2)
+            "face_confidence": _f(face_confidences[j], 2)
         }
-        
-        return deepface_data
-    except Exception as e:
-        print(f"Error analyzing {image_path}: {e}", file=sys.stderr)
-        return None
+        for j in rows
+    ]
+
+
+def batch_analyze_all(image_paths, batch=BATCH_SIZE):
+    """
+    Analyze images in chunks of `batch`, yielding one list of results per chunk
+    (in input order, None where the image could not be loaded or analyzed).
+    Images are preprocessed on a thread pool, and the next chunk is read from disk
+    while the current one runs through the models (one forward pass per model).
+    """
+    if not image_paths:
+        return
+    predict = build_models()
+    chunks = [image_paths[start:start + batch] for start in range(0, len(image_paths), batch)]
+    with ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS) as ex:
+        # Executor.map submits the whole chunk immediately, so this prefetches it
+        prefetched = ex.map(_try_preprocess, chunks[0])
+        for k, chunk in enumerate(chunks):
+            faces = list(prefetched)
+            if k + 1 < len(chunks):
+                prefetched = ex.map(_try_preprocess, chunks[k + 1])
+            ok = [j for j, face in enumerate(faces) if face is not None]
+            results = [None] * len(chunk)
+            if ok:
+                X = np.stack([faces[j][0] for j in ok])
+                X_gray = np.stack([faces[j][1] for j in ok])
+                outputs = predict(X, X_gray)
+                for j, deepface_data in zip(ok, _format_batch(*outputs, [faces[j][2] for j in ok])):
+                    results[j] = deepface_data
+            yield results
 
 
 def save_json(json_path, data):
     """Save JSON file with atomic write (write to temp file then rename)."""
     temp_path = json_path.with_suffix('.json.tmp')
-    with open(temp_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    temp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     temp_path.replace(json_path)
 
 
+def load_results(results_path):
+    """Load the JSONL results log into a dict of ID -> DEEPFACE data."""
+    results = {}
+    if not results_path.exists():
+        return results
+    with open(results_path, 'rb') as f:
+        for line in f:
+            try:
+                rec = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # truncated last line from an interrupted run
+            results[rec["ID"]] = rec["DEEPFACE"]
+    return results
+
+
+def trim_partial_line(path):
+    """
+    Truncate a JSONL log back to its last complete line. An interrupted run can leave a
+    record without its trailing newline; appending after it would glue the next record
+    onto the same undecodable line.
+    """
+    if not path.exists():
+        return
+    with open(path, 'rb+') as f:
+        size = f.seek(0, 2)
+        end = size
+        while end:
+            f.seek(max(0, end - 4096))
+            block = f.read(end - f.tell())
+            nl = block.rfind(b"\n")
+            if nl != -1:
+                end = end - len(block) + nl + 1
+                break
+            end -= len(block)
+        if end < size:
+            f.truncate(end)
+
+
+def index_by_id(data):
+    """
+    Group entries by ID, in file order. IDs repeat when the same mugshot is listed more
+    than once, so each ID maps to a list of entries (all sharing one analysis).
+    """
+    by_id = {}
+    for i, entry in enumerate(data, 1):
+        by_id.setdefault(entry.get("ID", f"entry_{i}"), []).append(entry)
+    return by_id
+
+
+def merge_results(by_id, results):
+    """Copy DEEPFACE data from results into entries by ID. Returns number of entries updated."""
+    merged = 0
+    for entry_id, deepface_data in results.items():
+        for entry in by_id.get(entry_id, ()):
+            if entry.get("DEEPFACE") != deepface_data:
+                entry["DEEPFACE"] = deepface_data
+                merged += 1
+    return merged
+
+
+def append_result(results_file, entry_id, deepface_data):
+    """Append a single analysis result to the JSONL results log."""
+    results_file.write(orjson.dumps({"ID": entry_id, "DEEPFACE": deepface_data}) + b"\n")
+
+
+def open_log(log_path):
+    """
+    Open the processing log for buffered appends. A daemon thread flushes it every
+    LOG_FLUSH_SECONDS and an atexit hook flushes whatever is left, instead of flushing per line.
+    """
+    log_file = io.TextIOWrapper(io.BufferedWriter(io.FileIO(log_path, 'a'), buffer_size=64 * 1024), encoding='utf-8')
+
+    def flush_log():
+        with _log_lock:
+            if not log_file.closed:
+                log_file.flush()
+
+    def flush_periodically():
+        while not log_file.closed:
+            time.sleep(LOG_FLUSH_SECONDS)
+            flush_log()
+
+    threading.Thread(target=flush_periodically, daemon=True).start()
+    atexit.register(flush_log)
+    return log_file
+
+
+def close_log(log_file):
+    """Close the log under the lock so the background flusher never sees a half-closed file."""
+    with _log_lock:
+        log_file.close()
+
+
 def log_entry(log_file, entry_id, name, status, message=""):
     """Log an entry processing attempt."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_file.write(f"{timestamp} | {entry_id} | {name} | {status}")
+    line = f"{timestamp} | {entry_id} | {name} | {status}"
     if message:
-        log_file.write(f" | {message}")
-    log_file.write("\n")
-    log_file.flush()
+        line += f" | {message}"
+    with _log_lock:
+        log_file.write(line + "\n")
+
+
+def record_results(pending, results, log_file, results_file):
+    """
+    Store results for pending (entry_id, entries, image_path) items in place, appending them
+    to results_file unless it is None. Returns (processed, errors) counted in entries.
+    """
+    processed = 0
+    errors = 0
+    for (entry_id, entries, _), deepface_data in zip(pending, results):
+        entry_name = entries[0].get("NAME", "Unknown")
+        if deepface_data:
+            for entry in entries:
+                entry["DEEPFACE"] = deepface_data
+            if results_file is not None:
+                append_result(results_file, entry_id, deepface_data)
+            processed += len(entries)
+            log_entry(log_file, entry_id, entry_name, "SUCCESS", f"Age: {deepface_data['age']}, Gender: {deepface_data['gender']['dominant']}")
+        else:
+            errors += len(entries)
+            log_entry(log_file, entry_id, entry_name, "ERROR", "DeepFace analysis failed")
+    return processed, errors
+
+
+def _pin_worker(shard_idx, nproc):
+    """Pin this worker process to its own slice of CPUs and size TF's thread pools to match."""
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cpus) // nproc)
+        mine = cpus[shard_idx * per_worker:(shard_idx + 1) * per_worker] or cpus
+        os.sched_setaffinity(0, mine)
+        threads = len(mine)
+    else:
+        threads = max(1, (os.cpu_count() or 2) // nproc)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+
+def process_shard(shard_idx, nproc, items, shard_path):
+    """
+    Worker process: analyze (entry_id, image_path) items with its own model instances,
+    appending results to shard_path as JSONL. Failed images are simply not logged; the
+    parent counts successes and failures from the merged shard results.
+    """
+    _pin_worker(shard_idx, nproc)
+    done = 0
+    trim_partial_line(Path(shard_path))
+    with open(shard_path, 'ab', buffering=1 << 16) as shard_file:
+        for results in batch_analyze_all([image_path for _, image_path in items]):
+            chunk = items[done:done + len(results)]
+            done += len(chunk)
+            for (entry_id, _), deepface_data in zip(chunk, results):
+                if deepface_data:
+                    append_result(shard_file, entry_id, deepface_data)
+            shard_file.flush()
+            print(f"[worker {shard_idx}] [{done}/{len(items)}]", flush=True)
+
+
+def _shard_paths(results_path):
+    return sorted(results_path.parent.glob("deepface_shard_*.jsonl"))
+
+
+def merge_shard_files(results_path):
+    """Append worker shard logs to the main results log and remove them. Returns the merged results."""
+    merged = {}
+    shard_paths = _shard_paths(results_path)
+    if not shard_paths:
+        return merged
+    trim_partial_line(results_path)
+    with open(results_path, 'ab') as results_file:
+        for shard_path in shard_paths:
+            shard_results = load_results(shard_path)
+            for entry_id, deepface_data in shard_results.items():
+                append_result(results_file, entry_id, deepface_data)
+            merged.update(shard_results)
+    for shard_path in shard_paths:
+        shard_path.unlink()
+    return merged
+
 
+def run_workers(pending, nproc, results_path):
+    """Analyze pending (entry_id, entries, image_path) items across nproc spawned worker processes."""
+    items = [(entry_id, str(image_path)) for entry_id, _, image_path in pending]
+    shards = [items[k::nproc] for k in range(nproc)]
+    shard_args = [
+        (k, nproc, shard, str(results_path.parent / f"deepface_shard_{k}.jsonl"))
+        for k, shard in enumerate(shards) if shard
+    ]
+    print(f"Fanning out over {len(shard_args)} worker processes...")
+    with multiprocessing.get_context("spawn").Pool(len(shard_args)) as pool:
+        pool.starmap(process_shard, shard_args)
+    return merge_shard_files(results_path)
 
-def main():
+
+def main(workers=None):
     script_dir = Path(__file__).parent
     json_path = script_dir / "output" / "mugshots.json"
+    results_path = script_dir / "output" / "deepface_results.jsonl"
     log_path = script_dir / "output" / "deepface_processing.log"
     
     if not json_path.exists():
@@ -91,67 +472,106 @@ def main():
     
     # Load JSON
     print(f"Loading {json_path}...")
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = orjson.loads(json_path.read_bytes())
+    by_id = index_by_id(data)
+    
+    # Resume: fold in shard logs left by an interrupted multi-process run, then apply
+    # results logged since the last rewrite of mugshots.json
+    merge_shard_files(results_path)
+    if merge_results(by_id, load_results(results_path)):
+        save_json(json_path, data)
     
     total = len(data)
     processed = 0
     already_done = 0
     skipped_no_pic = 0
     errors = 0
+    unflushed = 0
+    uncompacted = 0
     
     # Open log file in append mode
-    log_file = open(log_path, 'a', encoding='utf-8')
+    log_file = open_log(log_path)
     log_entry(log_file, "SESSION", "START", "Session started", f"Total entries: {total}")
+    trim_partial_line(results_path)
+    results_file = open(results_path, 'ab', buffering=1 << 16)
     
     print(f"Processing {total} entries...")
     print(f"Log file: {log_path}")
-    print(f"Saving progress incrementally (every successful analysis)\n")
+    print(f"Appending results to {results_path} (mugshots.json rewritten every {COMPACT_EVERY})\n")
     
-    # Process each entry
-    for i, entry in enumerate(data, 1):
-        entry_id = entry.get("ID", f"entry_{i}")
-        entry_name = entry.get("NAME", "Unknown")
+    # Collect IDs that still need analysis (one image per ID)
+    pending = []
+    for entry_id, entries in by_id.items():
+        entry_name = entries[0].get("NAME", "Unknown")
         
-        # Skip if already processed
-        if "DEEPFACE" in entry:
-            already_done += 1
-            if i % 100 == 0:  # Print progress every 100 entries
-                print(f"[{i}/{total}] Already processed: {already_done}, New: {processed}, Skipped: {skipped_no_pic}, Errors: {errors}")
+        # Skip if already processed; duplicate listings missing the result get a copy
+        existing = next((e["DEEPFACE"] for e in entries if "DEEPFACE" in e), None)
+        if existing is not None:
+            for entry in entries:
+                if "DEEPFACE" not in entry:
+                    entry["DEEPFACE"] = existing
+                    uncompacted += 1
+            already_done += len(entries)
             continue
         
-        picture_local = entry.get("PICTURE_LOCAL")
+        picture_local = next((e["PICTURE_LOCAL"] for e in entries if e.get("PICTURE_LOCAL")), None)
         
         if not picture_local:
-            skipped_no_pic += 1
+            skipped_no_pic += len(entries)
             log_entry(log_file, entry_id, entry_name, "SKIPPED", "No PICTURE_LOCAL")
             continue
         
         # Check if file exists
         image_path = Path(picture_local)
         if not image_path.exists():
-            skipped_no_pic += 1
+            skipped_no_pic += len(entries)
             log_entry(log_file, entry_id, entry_name, "SKIPPED", f"File not found: {image_path}")
             continue
         
-        # Run deepface analysis
-        print(f"[{i}/{total}] Processing: {entry_name}...", end=" ", flush=True)
-        deepface_data = analyze_image(str(image_path))
+        pending.append((entry_id, entries, image_path))
+    
+    print(f"Already processed: {already_done}, Skipped: {skipped_no_pic}, To analyze: {len(pending)}")
+    
+    # Several processes only pay off on CPU; on GPU they would contend for one device
+    if workers is None:
+        cpu_only = os.environ.get("DEEPFACE_CPU_ONLY", "").lower() in ("1", "true", "yes")
+        workers = max(1, (os.cpu_count() or 2) // 2) if cpu_only else 1
+    workers = min(workers, len(pending))
+    
+    done = 0
+    try:
+        if workers > 1:
+            results_file.flush()
+            shard_results = run_workers(pending, workers, results_path)
+            results = [shard_results.get(entry_id) for entry_id, _, _ in pending]
+            # Shard results are already in the main log, so they are not appended again
+            ok, failed = record_results(pending, results, log_file, None)
+            processed += ok
+            errors += failed
+            uncompacted += ok
+            pending = []
         
-        if deepface_data:
-            entry["DEEPFACE"] = deepface_data
-            processed += 1
-            print("✓")
-            log_entry(log_file, entry_id, entry_name, "SUCCESS", f"Age: {deepface_data['age']}, Gender: {deepface_data['gender']['dominant']}")
-            
-            # Save JSON after each successful analysis
+        # Run deepface analysis in batches of BATCH_SIZE
+        for results in batch_analyze_all([str(image_path) for _, _, image_path in pending]):
+            chunk = pending[done:done + len(results)]
+            done += len(chunk)
+            ok, failed = record_results(chunk, results, log_file, results_file)
+            processed += ok
+            errors += failed
+            unflushed += ok
+            uncompacted += ok
+            print(f"[{done}/{len(pending)}] ✓ {ok}" + (f", ✗ {failed}" if failed else ""))
+            if unflushed >= FLUSH_EVERY:
+                results_file.flush()
+                unflushed = 0
+            if uncompacted >= COMPACT_EVERY:
+                save_json(json_path, data)
+                uncompacted = 0
+    finally:
+        results_file.close()
+        close_log(log_file)
+        if uncompacted:
             save_json(json_path, data)
-        else:
-            errors += 1
-            print("✗ (error)")
-            log_entry(log_file, entry_id, entry_name, "ERROR", "DeepFace analysis failed")
-    
-    log_file.close()
     
     print(f"\n{'='*60}")
     print(f"Complete!")
@@ -160,9 +580,18 @@ def main():
     print(f"  Skipped (no picture): {skipped_no_pic}")
     print(f"  Errors: {errors}")
     print(f"  Total: {total}")
+    print(f"  Results log: {results_path}")
     print(f"  Log saved to: {log_path}")
     print(f"{'='*60}")
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Add DeepFace analysis data to mugshots.json")
+    ap.add_argument("--export-onnx", action="store_true", help=f"Export the attribute models to {ONNX_DIR} and exit")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Worker processes (default: half the CPUs with DEEPFACE_CPU_ONLY=1, else 1)")
+    args = ap.parse_args()
+    if args.export_onnx:
+        export_onnx()
+    else:
+        main(workers=args.workers)
@@ -22,6 +22,11 @@ os.environ["TF_CPP_MIN_VLOG_LEVEL"] = "3"
 if os.environ.get("DEEPFACE_CPU_ONLY", "").lower() in ("1", "true", "yes"):
     os.environ["CUDA_VISIBLE_DEVICES"] = "-1"  # hide GPUs before TF loads, avoids CUDA log spam
 
+# Bound TensorFlow's CPU thread pools (must be set before TF loads); existing values win
+os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(max(1, (os.cpu_count() or 2) // 2)))
+os.environ.setdefault("TF_NUM_INTEROP_THREADS", "2")
+os.environ.setdefault("OMP_NUM_THREADS", os.environ["TF_NUM_INTRAOP_THREADS"])
+
 from deepface import DeepFace
 
 
@@ -47,10 +52,17 @@ def pretty_print(result, image_name: str = "") -> None:
         print()
 
 
-def deep_face(image_path: str, actions=None):
+def deep_face(image_path: str, actions=None, detector_backend: str = "skip"):
+    """Analyze a mugshot. Mugshots are face-centered, so detection is skipped by default."""
     if actions is None:
         actions = ["age", "gender", "race", "emotion"]
-    return DeepFace.analyze(img_path=image_path, actions=actions)
+    return DeepFace.analyze(
+        img_path=image_path,
+        actions=actions,
+        detector_backend=detector_backend,
+        enforce_detection=False,
+        align=False,
+    )
 
 
 if __name__ == "__main__":
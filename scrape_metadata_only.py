@@ -20,7 +20,7 @@ if __name__ == "__main__":
     data_path.parent.mkdir(parents=True, exist_ok=True)
 
     print(f"Scraping metadata only (pages {args.start}–{args.end}), no image downloads...")
-    print(f"Writing incrementally to {data_path}")
+    print(f"Writing incrementally to {data_path.with_suffix('.ndjson')} (JSON written to {data_path} at the end)")
     records = scrape_all(
         start=args.start,
         end=args.end,
@@ -1,23 +1,28 @@
 """
 DHS WOW mugshot scraper.
-Fetches mugshots and metadata from https://www.dhs.gov/wow via Selenium,
-downloads images, saves data as JSON.
+Fetches mugshots and metadata from https://www.dhs.gov/wow over plain HTTP when
+the listing is server-rendered (Selenium otherwise), downloads images, saves data as JSON.
 """
 
-import base64
-import json
 import re
-import time
+import shutil
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
+import lxml.html
+import orjson
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
+from urllib3.util.retry import Retry
 from webdriver_manager.chrome import ChromeDriverManager
 
 ROOT_LINK = "https://www.dhs.gov/wow?page="  # add integer, page 0 to 1687
@@ -25,53 +30,120 @@ BASE_URL = "https://www.dhs.gov"
 OUTPUT_DIR = Path(__file__).resolve().parent / "output"
 MUGSHOTS_DIR = OUTPUT_DIR / "mugshots"
 DATA_FILE = OUTPUT_DIR / "mugshots.json"
-
-
-def _make_driver(headless: bool = True) -> webdriver.Chrome:
+DOWNLOAD_WORKERS = 8  # concurrent image downloads per page
+PAGE_DONE_KEY = "__page_done__"  # NDJSON marker line written after each completed page
+# Resource URL patterns Chrome skips when the driver is made with load_images=False.
+# Patterns match the whole URL, so the trailing * also covers query strings (?itok=..., ?v=...).
+BLOCKED_RESOURCE_URLS = ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.svg*", "*.woff*", "*.ttf*", "*.css*"]
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate matching a whole class token, like the CSS selector .name."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Card selectors, compiled once at import
+_XP_CARDS = etree.XPath(f"//li[{_has_class('usa-card')}]")
+_XP_HEADING = etree.XPath(f".//h2[{_has_class('usa-card__heading')}]")
+_XP_NAME = etree.XPath(f".//*[{_has_class('usa-card_name')}]")
+_XP_CRIME = etree.XPath(f".//*[{_has_class('usa-card__crime')}]")
+_XP_LOCATION = etree.XPath(f".//*[{_has_class('usa-card__location')}]")
+_XP_IMG = etree.XPath(f".//*[{_has_class('usa-card__media')}]//img")
+_XP_GANG = etree.XPath(f".//*[{_has_class('usa-card__gang')}]")
+_XP_BODY_DIVS = etree.XPath(f".//*[{_has_class('usa-card__body')}]/div")
+_XP_TEXT = etree.XPath(".//text()")
+
+_FNAME_BAD = re.compile(r'[<>:"/\\|?*]')
+_GANG_PREFIX = re.compile(r"Gang\s+Affiliation\s*:\s*", re.I)
+_MUGSHOT_HASH = re.compile(r"wow-mugshot-([a-f0-9]+)\.(?:jpg|png)", re.I)
+_IMG_BASENAME = re.compile(r"/([^/]+)\.(?:jpg|png)")
+_NAME_SAFE = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+def _make_session() -> requests.Session:
+    """HTTP session with a keep-alive connection pool and retries for image downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    return session
+
+
+SESSION = _make_session()
+
+
+def _make_driver(headless: bool = True, load_images: bool = True) -> webdriver.Chrome:
+    """Chrome driver. With load_images=False, images, CSS and fonts are not fetched
+    (card HTML and img src attributes are still rendered), which speeds up metadata-only runs.
+    """
     opts = Options()
     if headless:
         opts.add_argument("--headless=new")
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
     opts.add_argument("--disable-gpu")
+    if not load_images:
+        opts.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.images": 2,
+        })
     service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=opts)
+    driver = webdriver.Chrome(service=service, options=opts)
+    if not load_images:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_URLS})
+    return driver
 
 
 def _sanitize_filename(s: str) -> str:
-    return re.sub(r'[<>:"/\\|?*]', "_", s).strip() or "unknown"
+    return _FNAME_BAD.sub("_", s).strip() or "unknown"
+
+
+def _text(el) -> str:
+    """Stripped text nodes of an element and its descendants, concatenated."""
+    return "".join(t.strip() for t in _XP_TEXT(el))
+
+
+def _first(xpath: etree.XPath, el):
+    found = xpath(el)
+    return found[0] if found else None
 
 
 def _parse_card(li, index_offset: int) -> dict | None:
-    """Parse a single li.usa-card into mugshot data."""
-    heading = li.select_one("h2.usa-card__heading")
-    name_el = li.select_one(".usa-card_name")
-    crime_el = li.select_one(".usa-card__crime")
-    location_el = li.select_one(".usa-card__location")
-    img = li.select_one(".usa-card__media img")
-
-    if not all([heading, name_el, crime_el, location_el, img]):
+    """Parse a single li.usa-card lxml element into mugshot data."""
+    heading = _first(_XP_HEADING, li)
+    name_el = _first(_XP_NAME, li)
+    crime_el = _first(_XP_CRIME, li)
+    location_el = _first(_XP_LOCATION, li)
+    img = _first(_XP_IMG, li)
+
+    if any(el is None for el in (heading, name_el, crime_el, location_el, img)):
         return None
 
-    country = heading.get_text(strip=True)
-    raw_name = name_el.get_text(strip=True).replace("Name:", "").strip()
+    country = _text(heading)
+    raw_name = _text(name_el).replace("Name:", "").strip()
     name = raw_name or "Unknown"
 
-    raw_crime = crime_el.get_text(strip=True).replace("Convicted of:", "").strip()
+    raw_crime = _text(crime_el).replace("Convicted of:", "").strip()
     convicted_of = [c.strip() for c in raw_crime.split(",") if c.strip()] if raw_crime else []
 
-    raw_loc = location_el.get_text(strip=True).replace("Arrested:", "").strip()
+    raw_loc = _text(location_el).replace("Arrested:", "").strip()
     arrested = raw_loc.replace("\xa0", " ").strip() if raw_loc else ""
 
     gang_affiliation = ""
-    gang_el = li.select_one(".usa-card__gang")
-    if gang_el:
-        gang_affiliation = re.sub(r"Gang\s+Affiliation\s*:\s*", "", gang_el.get_text(strip=True), flags=re.I).strip()
+    gang_el = _first(_XP_GANG, li)
+    if gang_el is not None:
+        gang_affiliation = _GANG_PREFIX.sub("", _text(gang_el)).strip()
     else:
-        for div in li.select(".usa-card__body > div"):
-            t = div.get_text(strip=True)
+        for div in _XP_BODY_DIVS(li):
+            t = _text(div)
             if "Gang Affiliation" in t:
-                gang_affiliation = re.sub(r"Gang\s+Affiliation\s*:\s*", "", t, flags=re.I).strip()
+                gang_affiliation = _GANG_PREFIX.sub("", t).strip()
                 break
 
     src = img.get("src", "")
@@ -80,13 +152,13 @@ def _parse_card(li, index_offset: int) -> dict | None:
     picture_url = urljoin(BASE_URL, src)
 
     # Use hash from filename for unique ID, e.g. wow-mugshot-01e06361f372bb503291a899ec89affa.jpg
-    m = re.search(r"wow-mugshot-([a-f0-9]+)\.(?:jpg|png)", src, re.I)
+    m = _MUGSHOT_HASH.search(src)
     if m:
         file_id = m.group(1)
     else:
         # e.g. "Sahal%20Osman%20Shidane.png" -> use sanitized name + index
-        m2 = re.search(r"/([^/]+)\.(?:jpg|png)", src)
-        file_id = re.sub(r"[^a-zA-Z0-9_-]", "_", (m2.group(1) if m2 else "")) or f"idx{index_offset}"
+        m2 = _IMG_BASENAME.search(src)
+        file_id = _NAME_SAFE.sub("_", (m2.group(1) if m2 else "")) or f"idx{index_offset}"
 
     return {
         "ID": file_id,
@@ -100,100 +172,133 @@ def _parse_card(li, index_offset: int) -> dict | None:
     }
 
 
-def _download_image_via_selenium(driver: webdriver.Chrome, url: str, save_path: Path) -> bool:
-    """Fetch image via same-origin fetch() in page context; save to disk."""
+def _image_path(rec: dict, mugshots_path: Path) -> Path:
+    """Local image path for a record: <ID>_<name>.<ext>, derived from parsed data only."""
+    ext = "jpg"
+    if ".png" in rec["PICTURE"].lower():
+        ext = "png"
+    safe_name = _sanitize_filename(rec["NAME"])[:80]
+    return mugshots_path / f"{rec['ID']}_{safe_name}.{ext}"
+
+
+def _download_image_http(session: requests.Session, url: str, save_path: Path) -> bool:
+    """Stream image from url to disk over a pooled HTTP connection."""
     try:
-        b64 = driver.execute_async_script(
-            """
-            const url = arguments[0];
-            const callback = arguments[arguments.length - 1];
-            fetch(url)
-                .then(r => r.blob())
-                .then(blob => {
-                    const fr = new FileReader();
-                    fr.onload = () => {
-                        const dataUrl = fr.result;
-                        const b64 = dataUrl.indexOf(',') >= 0 ? dataUrl.split(',')[1] : '';
-                        callback(b64);
-                    };
-                    fr.onerror = () => callback(null);
-                    fr.readAsDataURL(blob);
-                })
-                .catch(() => callback(null));
-            """,
-            url,
-        )
-        if not b64:
-            return False
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(save_path, "wb") as f:
-            f.write(base64.b64decode(b64))
+        with session.get(url, timeout=10, stream=True) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            tmp_path = save_path.with_name(save_path.name + ".part")
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(r.raw, f)
+            tmp_path.replace(save_path)
         return True
     except Exception:
         return False
 
 
-def _fetch_page(driver: webdriver.Chrome, page: int, wait_s: int = 1) -> BeautifulSoup | None:
+def _cards_rendered(driver: webdriver.Chrome) -> bool:
+    """True once the page has cards and every card image has its src populated."""
+    imgs = driver.find_elements(By.CSS_SELECTOR, "li.usa-card .usa-card__media img")
+    return bool(imgs) and all(img.get_attribute("src") for img in imgs)
+
+
+def _fetch_page(driver: webdriver.Chrome, page: int, wait_s: int = 5) -> lxml.html.HtmlElement | None:
     url = f"{ROOT_LINK}{page}"
     try:
-        
         driver.get(url)
-        WebDriverWait(driver, wait_s).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "li.usa-card"))
-        )
-        time.sleep(1)
-        return BeautifulSoup(driver.page_source, "html.parser")
+        WebDriverWait(driver, wait_s, ignored_exceptions=(StaleElementReferenceException,)).until(_cards_rendered)
+        return lxml.html.fromstring(driver.page_source)
+    except Exception:
+        return None
+
+
+def _fetch_page_http(session: requests.Session, page: int) -> lxml.html.HtmlElement | None:
+    """Fetch a listing page's server-rendered HTML directly (no browser)."""
+    try:
+        r = session.get(f"{ROOT_LINK}{page}", timeout=10)
+        r.raise_for_status()
+        return lxml.html.fromstring(r.content)
     except Exception:
         return None
 
 
+def _pages_server_rendered(session: requests.Session, page: int = 0) -> bool:
+    """Probe whether listing cards are present in the raw HTML, i.e. Selenium is not needed."""
+    doc = _fetch_page_http(session, page)
+    return doc is not None and len(_XP_CARDS(doc)) > 0
+
+
 def scrape_page(
     page: int,
     download_images: bool = True,
     output_dir: Path | None = None,
     driver: webdriver.Chrome | None = None,
     headless: bool = True,
-) -> list[dict]:
+    mugshots_path: Path | None = None,
+    use_http: bool = False,
+    get_driver: Callable[[], webdriver.Chrome] | None = None,
+) -> list[dict] | None:
     """
-    Scrape a single page (0-indexed). Returns list of mugshot records.
-    If driver is provided, it is not closed; otherwise a new one is created and closed.
+    Scrape a single page (0-indexed). Returns list of mugshot records, or None if the
+    page could not be fetched (as opposed to [] for a page with no cards).
+    If use_http is set, the page is fetched over plain HTTP and Selenium is only used
+    when that yields no cards.
+    If driver is provided, it is not closed. Otherwise get_driver() is called for one when
+    the page needs Selenium (the caller owns and closes it); without either, a new driver
+    is created and closed.
+    If mugshots_path is provided, it must already exist (scrape_all creates it once).
     """
-    out = output_dir or OUTPUT_DIR
-    mugshots_path = out / "mugshots"
-    mugshots_path.mkdir(parents=True, exist_ok=True)
-
-    own_driver = driver is None
-    if own_driver:
-        driver = _make_driver(headless=headless)
-    try:
-        soup = _fetch_page(driver, page)
-        if not soup:
-            return []
-
-        cards = soup.select("li.usa-card")
-        records = []
-        for i, li in enumerate(cards):
-            rec = _parse_card(li, page * 1000 + i)
-            if not rec:
-                continue
-
-            if download_images:
-                ext = "jpg"
-                if ".png" in rec["PICTURE"].lower():
-                    ext = "png"
-                safe_name = _sanitize_filename(rec["NAME"])[:80]
-                fname = f"{rec['ID']}_{safe_name}.{ext}"
-                save_path = mugshots_path / fname
-                if _download_image_via_selenium(driver, rec["PICTURE"], save_path):
-                    rec["PICTURE_LOCAL"] = str(save_path)
-                time.sleep(0.25)
+    if mugshots_path is None:
+        out = output_dir or OUTPUT_DIR
+        mugshots_path = out / "mugshots"
+        if download_images:
+            mugshots_path.mkdir(parents=True, exist_ok=True)
+
+    doc = _fetch_page_http(SESSION, page) if use_http else None
+    cards = _XP_CARDS(doc) if doc is not None else []
+    if not cards:
+        if driver is None and get_driver is not None:
+            driver = get_driver()
+        own_driver = driver is None
+        if own_driver:
+            driver = _make_driver(headless=headless, load_images=download_images)
+        try:
+            doc = _fetch_page(driver, page)
+        finally:
+            if own_driver and driver:
+                driver.quit()
+        if doc is None:
+            return None
+        cards = _XP_CARDS(doc)
 
+    records = []
+    for i, li in enumerate(cards):
+        rec = _parse_card(li, page * 1000 + i)
+        if rec:
             records.append(rec)
 
-        return records
-    finally:
-        if own_driver and driver:
-            driver.quit()
+    if download_images and records:
+        # Downloads are I/O bound; fetch the whole page's images concurrently
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+            # One download per file: a page can list the same record twice
+            by_path = {}
+            for rec in records:
+                by_path.setdefault(_image_path(rec, mugshots_path), []).append(rec)
+            futures = {}
+            for save_path, recs in by_path.items():
+                # Already downloaded on a previous run: no network I/O needed
+                if save_path.exists() and save_path.stat().st_size > 0:
+                    for rec in recs:
+                        rec["PICTURE_LOCAL"] = str(save_path)
+                    continue
+                futures[ex.submit(_download_image_http, SESSION, recs[0]["PICTURE"], save_path)] = (recs, save_path)
+            for f in as_completed(futures):
+                recs, save_path = futures[f]
+                if f.result():
+                    for rec in recs:
+                        rec["PICTURE_LOCAL"] = str(save_path)
+
+    return records
 
 
 def scrape_all(
@@ -205,39 +310,140 @@ def scrape_all(
     save_every_page: Path | str | None = None,
 ) -> list[dict]:
     """Scrape all pages from start to end (inclusive). end=None means up to page 1687.
-    If save_every_page is set, append and save JSON after each page (incremental write).
+    If save_every_page is set, each page's records are appended to an NDJSON sidecar
+    (save_every_page with suffix .ndjson) and the JSON file is written once at the end.
+    Resumable: pages already marked done in the sidecar are skipped (delete it to start over).
     """
     if end is None:
         end = 1687
     out = output_dir or OUTPUT_DIR
+    mugshots_path = out / "mugshots"
+    if download_images:
+        mugshots_path.mkdir(parents=True, exist_ok=True)
     save_path = Path(save_every_page) if save_every_page else None
+    ndjson_path = save_path.with_suffix(".ndjson") if save_path else None
     all_records = []
-    driver = _make_driver(headless=headless)
+    done_pages = set()
+    if ndjson_path is not None:
+        ndjson_path.parent.mkdir(parents=True, exist_ok=True)
+        end_offset = 0
+        for done_page, recs, end_offset in _iter_ndjson_pages(ndjson_path):
+            done_pages.add(done_page)
+            all_records.extend(recs)
+        if ndjson_path.exists() and ndjson_path.stat().st_size > end_offset:
+            # Drop anything after the last page marker (an interrupted page or partial line)
+            with open(ndjson_path, "rb+") as f:
+                f.truncate(end_offset)
+    # Only pages without a done marker are fetched; completed pages need not be contiguous
+    todo = [p for p in range(start, end + 1) if p not in done_pages]
+    if not todo:
+        print(f"All pages {start}-{end} already scraped")
+        if ndjson_path is not None:
+            finalize_json(ndjson_path, save_path)
+        return all_records
+    if len(todo) < end - start + 1:
+        print(f"Resuming with {len(todo)} of {end - start + 1} pages left ({len(all_records)} records already in {ndjson_path})")
+    # Prefer plain HTTP when the listing is server-rendered; otherwise keep one Chrome for the crawl
+    use_http = _pages_server_rendered(SESSION, todo[0])
+    print("Fetching pages over HTTP" if use_http else "Cards not in raw HTML; fetching pages with Selenium")
+    driver = None if use_http else _make_driver(headless=headless, load_images=download_images)
+
+    def fallback_driver() -> webdriver.Chrome:
+        # HTTP mode: start Chrome only once a page first needs it, then reuse it
+        nonlocal driver
+        if driver is None:
+            driver = _make_driver(headless=headless, load_images=download_images)
+        return driver
+
     try:
-        for page in range(start, end + 1):
+        for page in todo:
             recs = scrape_page(
                 page,
                 download_images=download_images,
                 output_dir=out,
                 driver=driver,
+                headless=headless,
+                mugshots_path=mugshots_path,
+                use_http=use_http,
+                get_driver=fallback_driver,
             )
+            if recs is None:
+                # No done marker, so the next run retries this page
+                print(f"Page {page}: fetch failed")
+                continue
             all_records.extend(recs)
             if recs:
                 print(f"Page {page}: {len(recs)} mugshots")
-            if save_path is not None:
-                save_data(all_records, save_path)
-            time.sleep(0.5)
+            if ndjson_path is not None:
+                append_records_ndjson(recs, ndjson_path, page=page)
         return all_records
     finally:
-        driver.quit()
+        if driver is not None:
+            driver.quit()
+        if ndjson_path is not None:
+            finalize_json(ndjson_path, save_path)
 
 
 def save_data(records: list[dict], path: Path | None = None) -> None:
     path = path or DATA_FILE
     path = Path(path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
+    path.write_bytes(orjson.dumps(records, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+
+
+def append_records_ndjson(records: list[dict], path: Path, page: int) -> None:
+    """Append a page's records to an NDJSON file, one JSON object per line, followed by a
+    {PAGE_DONE_KEY: page} marker line. Everything goes out in a single write, so an
+    interrupt cannot leave the records on disk without their marker.
+    """
+    blob = b"".join(orjson.dumps(rec) + b"\n" for rec in records)
+    blob += orjson.dumps({PAGE_DONE_KEY: page}) + b"\n"
+    with open(path, "ab") as f:
+        f.write(blob)
+
+
+def _iter_ndjson_pages(path: Path):
+    """
+    Yield (page, records, end_offset) for each completed page in an NDJSON sidecar, where
+    end_offset is the byte position just past the page's marker. Records not followed by
+    their page marker (an interrupted page) and blank or truncated lines are skipped.
+    """
+    if not path.exists():
+        return
+    records = []
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                obj = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # partial line from an interrupted write
+            if PAGE_DONE_KEY in obj:
+                yield obj[PAGE_DONE_KEY], records, offset
+                records = []
+            else:
+                records.append(obj)
+
+
+def finalize_json(ndjson_path: Path, json_path: Path) -> None:
+    """Stream the completed pages of an NDJSON sidecar into an indented JSON list (same layout as save_data)."""
+    json_path = Path(json_path)
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = json_path.with_name(json_path.name + ".tmp")
+    count = 0
+    with open(tmp_path, "wb") as dst:
+        for _, recs, _ in _iter_ndjson_pages(ndjson_path):
+            for obj in recs:
+                rec = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+                dst.write(b",\n" if count else b"[\n")
+                # Nest the record one level inside the list (JSON strings never contain raw newlines)
+                dst.write(b"\n".join(b"  " + ln for ln in rec.split(b"\n")))
+                count += 1
+        dst.write(b"\n]" if count else b"[]")
+    tmp_path.replace(json_path)
 
 
 def test_scrape_page_1(output_dir: Path | None = None) -> list[dict]:
@@ -249,7 +455,7 @@ def test_scrape_page_1(output_dir: Path | None = None) -> list[dict]:
     data_path = out / "mugshots_page1_test.json"
 
     print("Test: scraping page 1 (page=0) only...")
-    records = scrape_page(0, download_images=True, output_dir=out)
+    records = scrape_page(0, download_images=True, output_dir=out) or []
     print(f"Parsed {len(records)} mugshots from page 1.")
 
     if records:
@@ -276,8 +482,8 @@ def test_parse_list_html(html_path: Path | str | None = None) -> list[dict]:
         print(f"File not found: {path}")
         return []
     with open(path, encoding="utf-8") as f:
-        soup = BeautifulSoup(f.read(), "html.parser")
-    cards = soup.select("li.usa-card")
+        doc = lxml.html.fromstring(f.read())
+    cards = _XP_CARDS(doc)
     records = []
     for i, li in enumerate(cards):
         rec = _parse_card(li, i)